@@ -1,10 +1,21 @@
+import hashlib
+import heapq
+import json
 import os
+import sqlite3
+import threading
+import time
 import urllib.parse
+from concurrent.futures import Executor, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Set
+from typing import Iterator, List, NamedTuple, Optional, Set, Tuple
 
+import numpy as np
+import orjson
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 # ----------------------------
@@ -16,6 +27,32 @@ OMDB_API_KEY = os.getenv("OMDB_API_KEY", "")
 TMDB_BASE = "https://api.themoviedb.org/3"
 TMDB_IMG = "https://image.tmdb.org/t/p/w342"
 
+# Concurrent API calls per Recommend click (kept well under TMDB's ~50 req/s)
+MAX_WORKERS = 16
+DISCOVER_PAGES = 3
+
+# OMDb lookups are deferred until after ranking, and skip recs whose TMDB vote
+# is below the IMDb minimum minus this margin
+IMDB_PREFILTER_MARGIN = 0.5
+# Ranking bonus for recs that come back with an IMDb rating
+IMDB_QUALITY_BONUS = 0.25
+
+# Requests per second per API; bursts up to one second's worth
+RATE_LIMITS = {"tmdb": 40.0, "omdb": 10.0}
+
+# 429/5xx responses are retried through the rate limiter (see limited_get)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.2
+
+# On-disk HTTP cache (L2 under st.cache_data); survives app restarts. Entries
+# follow the response's Cache-Control (no-store, no-cache, max-age), falling
+# back to this TTL.
+DISK_CACHE_PATH = os.getenv("WATCH_PICKER_CACHE", ".api_cache.sqlite")
+DISK_CACHE_TTL = 60 * 60
+# Stale entries are kept this long past expiry for ETag revalidation, then pruned
+DISK_CACHE_RETENTION = 7 * 24 * 60 * 60
+
 
 # ----------------------------
 # Catalogs (mainstream)
@@ -49,64 +86,257 @@ REGIONS = ["US", "CA", "GB", "AU"]
 # ----------------------------
 # TMDB / OMDb helpers
 # ----------------------------
+@st.cache_resource(show_spinner=False)
+def get_session() -> requests.Session:
+    """
+    One keep-alive session shared by every user session; pool sized above MAX_WORKERS.
+    The adapter only retries connection errors; status retries go through
+    limited_get so each attempt is rate-limited.
+    """
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, status=0, backoff_factor=0.2, allowed_methods=["GET"]),
+        ),
+    )
+    return session
+
+
+@st.cache_resource(show_spinner=False)
+def get_disk_cache() -> Tuple[sqlite3.Connection, threading.Lock]:
+    """
+    Shared sqlite connection for the response cache, with the lock that guards it.
+    Prunes entries that expired more than DISK_CACHE_RETENTION ago on startup.
+    """
+    conn = sqlite3.connect(DISK_CACHE_PATH, check_same_thread=False)
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache "
+            "(key TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, expires REAL NOT NULL)"
+        )
+        conn.execute("DELETE FROM http_cache WHERE expires < ?", (time.time() - DISK_CACHE_RETENTION,))
+    return conn, threading.Lock()
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter. acquire() reserves its token under the lock and
+    sleeps outside it, so concurrent callers queue up instead of over-drawing.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter(api: str) -> TokenBucket:
+    """
+    One bucket per API, shared across reruns and user sessions.
+    """
+    rate = RATE_LIMITS[api]
+    return TokenBucket(rate=rate, capacity=rate)
+
+
+def limited_get(api: str, url: str, **kwargs) -> requests.Response:
+    """
+    GET through the shared session, taking a token from the API's bucket for
+    every attempt. 429/5xx responses are retried after Retry-After or an
+    exponential backoff; the last response is returned either way.
+    """
+    for attempt in range(RETRY_ATTEMPTS + 1):
+        get_rate_limiter(api).acquire()
+        r = get_session().get(url, **kwargs)
+        if r.status_code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS:
+            return r
+        retry_after = r.headers.get("Retry-After", "")
+        time.sleep(int(retry_after) if retry_after.isdigit() else RETRY_BACKOFF * 2**attempt)
+    return r
+
+
+def cache_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class CachedResponse(NamedTuple):
+    data: dict
+    etag: Optional[str]
+    fresh: bool
+
+
+def disk_cache_get(key: str) -> Optional[CachedResponse]:
+    """
+    Stored response for key, stale or not; stale ones can still be revalidated.
+    """
+    conn, lock = get_disk_cache()
+    with lock:
+        row = conn.execute("SELECT body, etag, expires FROM http_cache WHERE key = ?", (key,)).fetchone()
+    if not row:
+        return None
+    body, etag, expires = row
+    return CachedResponse(data=orjson.loads(body), etag=etag, fresh=expires > time.time())
+
+
+def disk_cache_set(key: str, data: dict, etag: Optional[str] = None, ttl: int = DISK_CACHE_TTL) -> None:
+    conn, lock = get_disk_cache()
+    with lock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO http_cache (key, body, etag, expires) VALUES (?, ?, ?, ?)",
+            (key, orjson.dumps(data), etag, time.time() + ttl),
+        )
+
+
+def disk_cache_touch(key: str, ttl: int = DISK_CACHE_TTL) -> None:
+    conn, lock = get_disk_cache()
+    with lock, conn:
+        conn.execute("UPDATE http_cache SET expires = ? WHERE key = ?", (time.time() + ttl, key))
+
+
+def revalidation_headers(entry: Optional[CachedResponse]) -> dict:
+    return {"If-None-Match": entry.etag} if entry and entry.etag else {}
+
+
+def response_ttl(r: requests.Response) -> Optional[int]:
+    """
+    How long r may be served from disk per its Cache-Control: None for no-store
+    (don't keep it), 0 for no-cache (revalidate on every use), else max-age,
+    falling back to DISK_CACHE_TTL.
+    """
+    directives = {}
+    for directive in r.headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    max_age = directives.get("max-age", "")
+    return int(max_age) if max_age.isdigit() else DISK_CACHE_TTL
+
+
 def tmdb_get(path: str, params: Optional[dict] = None) -> dict:
     if not TMDB_API_KEY:
         raise RuntimeError("Missing TMDB_API_KEY env var.")
     params = params or {}
-    params["api_key"] = TMDB_API_KEY
-    r = requests.get(f"{TMDB_BASE}{path}", params=params, timeout=20)
+    key = cache_key("tmdb", path, params)
+    entry = disk_cache_get(key)
+    if entry and entry.fresh:
+        return entry.data
+
+    r = limited_get(
+        "tmdb",
+        f"{TMDB_BASE}{path}",
+        params={**params, "api_key": TMDB_API_KEY},
+        headers=revalidation_headers(entry),
+        timeout=20,
+    )
+    ttl = response_ttl(r)
+    if entry and r.status_code == 304:
+        if ttl is not None:
+            disk_cache_touch(key, ttl)
+        return entry.data
     r.raise_for_status()
-    return r.json()
+    data = orjson.loads(r.content)
+    if ttl is not None:
+        disk_cache_set(key, data, r.headers.get("ETag"), ttl)
+    return data
+
+
+def normalize_title(title: str) -> str:
+    """
+    Search/dedup key for a user-entered title; the raw text is kept for display.
+    """
+    return title.strip().casefold()
 
 
-@st.cache_data(ttl=60 * 60)
-def tmdb_search_movie(title: str) -> Optional[dict]:
-    data = tmdb_get("/search/movie", {"query": title, "include_adult": "false"})
+@st.cache_data(ttl=60 * 60, show_spinner=False)
+def tmdb_search_movie(title_norm: str) -> Optional[dict]:
+    """
+    Best match for a title. Pass normalize_title(...) so "Heat" and "heat " share a cache entry.
+    """
+    data = tmdb_get("/search/movie", {"query": title_norm, "include_adult": "false"})
     results = data.get("results", [])
     return results[0] if results else None
 
 
-@st.cache_data(ttl=60 * 60)
-def tmdb_movie_external_ids(movie_id: int) -> dict:
-    return tmdb_get(f"/movie/{movie_id}/external_ids")
+@st.cache_data(ttl=60 * 60, show_spinner=False)
+def tmdb_movie_bundle(movie_id: int) -> dict:
+    """
+    Movie details with external ids and watch providers folded into one call.
+    """
+    return tmdb_get(f"/movie/{movie_id}", {"append_to_response": "external_ids,watch/providers"})
 
 
-@st.cache_data(ttl=60 * 60)
-def tmdb_movie_watch_providers(movie_id: int) -> dict:
-    return tmdb_get(f"/movie/{movie_id}/watch/providers")
+class Movie(NamedTuple):
+    """
+    The slice of a TMDB movie result that build_rec uses; what list endpoints cache.
+    """
+    id: Optional[int]
+    title: Optional[str]
+    release_date: Optional[str]
+    overview: Optional[str]
+    poster_path: Optional[str]
+    vote_average: Optional[float]
+
+
+def project_movies(results: List[dict]) -> List[Movie]:
+    return [
+        Movie(
+            id=m.get("id"),
+            title=m.get("title"),
+            release_date=m.get("release_date"),
+            overview=m.get("overview"),
+            poster_path=m.get("poster_path"),
+            vote_average=m.get("vote_average"),
+        )
+        for m in results
+    ]
 
 
-@st.cache_data(ttl=60 * 30)
-def tmdb_recommendations(movie_id: int, pages: int = 2) -> List[dict]:
-    out: List[dict] = []
+@st.cache_data(ttl=60 * 30, show_spinner=False)
+def tmdb_recommendations(movie_id: int, pages: int = 2) -> List[Movie]:
+    out: List[Movie] = []
     for p in range(1, pages + 1):
         data = tmdb_get(f"/movie/{movie_id}/recommendations", {"page": p})
-        out.extend(data.get("results", []))
+        out.extend(project_movies(data.get("results", [])))
     return out
 
 
-@st.cache_data(ttl=60 * 30)
-def tmdb_discover_movies(
-    region: str,
-    genre_id: Optional[int],
-    provider_ids: List[int],
-    pages: int = 3,
-) -> List[dict]:
-    out: List[dict] = []
-    for p in range(1, pages + 1):
-        params = {
-            "sort_by": "popularity.desc",
-            "watch_region": region,
-            "with_watch_providers": "|".join(str(x) for x in provider_ids) if provider_ids else None,
-            "with_genres": str(genre_id) if genre_id else None,
-            "include_adult": "false",
-            "vote_count.gte": 150,
-            "page": p,
-        }
-        params = {k: v for k, v in params.items() if v is not None}
-        data = tmdb_get("/discover/movie", params)
-        out.extend(data.get("results", []))
-    return out
+def discover_params(region: str, genre_id: Optional[int], provider_ids: List[int]) -> dict:
+    """
+    Query shared by every discover page; built once per Recommend click.
+    """
+    params = {
+        "sort_by": "popularity.desc",
+        "watch_region": region,
+        "with_watch_providers": "|".join(map(str, provider_ids)) if provider_ids else None,
+        "with_genres": str(genre_id) if genre_id else None,
+        "include_adult": "false",
+        "vote_count.gte": 150,
+    }
+    return {k: v for k, v in params.items() if v is not None}
+
+
+@st.cache_data(ttl=60 * 30, show_spinner=False)
+def tmdb_discover_page(params: dict, page: int) -> List[Movie]:
+    data = tmdb_get("/discover/movie", {**params, "page": page})
+    return project_movies(data.get("results", []))
 
 
 def safe_float(x: str) -> Optional[float]:
@@ -119,20 +349,34 @@ def safe_float(x: str) -> Optional[float]:
         return None
 
 
-@st.cache_data(ttl=60 * 60)
+@st.cache_data(ttl=60 * 60, show_spinner=False)
 def omdb_lookup(imdb_id: str) -> dict:
     if not OMDB_API_KEY:
         return {}
-    r = requests.get(
+    key = cache_key("omdb", imdb_id)
+    entry = disk_cache_get(key)
+    if entry and entry.fresh:
+        return entry.data
+
+    r = limited_get(
+        "omdb",
         "https://www.omdbapi.com/",
         params={"apikey": OMDB_API_KEY, "i": imdb_id},
+        headers=revalidation_headers(entry),
         timeout=20,
     )
+    ttl = response_ttl(r)
+    if entry and r.status_code == 304:
+        if ttl is not None:
+            disk_cache_touch(key, ttl)
+        return entry.data
     if r.status_code != 200:
         return {}
-    data = r.json()
+    data = orjson.loads(r.content)
     if data.get("Response") != "True":
         return {}
+    if ttl is not None:
+        disk_cache_set(key, data, r.headers.get("ETag"), ttl)
     return data
 
 
@@ -146,16 +390,8 @@ def extract_provider_ids_for_region(watch_data: dict, region: str) -> Set[int]:
     return {p.get("provider_id") for p in flatrate if p.get("provider_id") is not None}
 
 
-def movie_available_on_selected_services(movie_id: int, region: str, selected_provider_ids: Set[int]) -> bool:
-    if not selected_provider_ids:
-        return True
-    watch = tmdb_movie_watch_providers(movie_id)
-    ids_here = extract_provider_ids_for_region(watch, region)
-    return len(ids_here & selected_provider_ids) > 0
-
-
 # ----------------------------
-# UI components: service pills + tag chips
+# UI components: service pills + like tags
 # ----------------------------
 def inject_styles() -> None:
     st.markdown(
@@ -167,28 +403,6 @@ div[data-testid="stHorizontalBlock"] button[kind="secondary"] {
   padding: 0.35rem 0.75rem;
   border: 1px solid rgba(49, 51, 63, 0.2);
 }
-
-/* --- Chips for liked movies --- */
-.chip {
-  display: inline-flex;
-  align-items: center;
-  gap: 0.5rem;
-  padding: 0.25rem 0.6rem;
-  border-radius: 999px;
-  border: 1px solid rgba(49, 51, 63, 0.18);
-  margin: 0.2rem 0.25rem 0.2rem 0;
-  font-size: 0.9rem;
-  background: rgba(49, 51, 63, 0.04);
-}
-.chip button {
-  border: none;
-  background: transparent;
-  cursor: pointer;
-  font-size: 1rem;
-  line-height: 1;
-  padding: 0;
-}
-.small-muted { color: rgba(49,51,63,0.65); font-size: 0.9rem; }
 </style>
         """,
         unsafe_allow_html=True,
@@ -215,23 +429,24 @@ def service_pills(all_services: List[str], selected: Set[str]) -> Set[str]:
     return updated
 
 
-def render_like_chips(titles: List[str]) -> None:
+def _sync_like_titles() -> None:
+    st.session_state.like_titles = list(st.session_state.like_titles_sel)
+
+
+def like_tags(titles: List[str]) -> None:
     """
-    Show liked titles as chips with remove buttons.
+    Show liked titles as removable tags in a single widget. The widget's
+    state ("like_titles_sel") is the selection; removing a tag syncs it back
+    into like_titles.
     """
-    if not titles:
-        st.markdown('<div class="small-muted">No “like” movies added yet.</div>', unsafe_allow_html=True)
-        return
-
-    # Render chips in rows (simple approach)
-    for t in titles:
-        c1, c2 = st.columns([10, 1])
-        with c1:
-            st.markdown(f'<span class="chip">{t}</span>', unsafe_allow_html=True)
-        with c2:
-            if st.button("✕", key=f"rm_{t}"):
-                st.session_state.like_titles = [x for x in st.session_state.like_titles if x != t]
-                st.rerun()
+    st.multiselect(
+        "Liked movies",
+        options=titles,
+        key="like_titles_sel",
+        on_change=_sync_like_titles,
+        placeholder="No “like” movies added yet.",
+        label_visibility="collapsed",
+    )
 
 
 # ----------------------------
@@ -247,32 +462,26 @@ class Rec:
     tmdb_vote: Optional[float]
     imdb_rating: Optional[float]
     score: float
+    imdb_link: str
+    watch_link: str
 
 
-def build_rec(movie: dict, like_bonus: float = 0.0) -> Optional[Rec]:
-    tmdb_id = movie.get("id")
-    title = movie.get("title") or ""
+def build_rec(movie: Movie, like_bonus: float = 0.0, watch_service: Optional[str] = None) -> Optional[Rec]:
+    tmdb_id = movie.id
+    title = movie.title or ""
     if not tmdb_id or not title:
         return None
 
-    release_date = movie.get("release_date") or ""
-    year = int(release_date[:4]) if release_date[:4].isdigit() else None
-    overview = movie.get("overview") or ""
-    poster_path = movie.get("poster_path")
-    poster_url = f"{TMDB_IMG}{poster_path}" if poster_path else None
-    tmdb_vote = movie.get("vote_average")
-
-    imdb_rating = None
-    if OMDB_API_KEY:
-        ext = tmdb_movie_external_ids(tmdb_id)
-        imdb_id = ext.get("imdb_id")
-        if imdb_id:
-            om = omdb_lookup(imdb_id)
-            imdb_rating = safe_float(om.get("imdbRating"))
-
-    base = float(tmdb_vote or 0.0)
-    quality = 0.25 if imdb_rating is not None else 0.0
-    score = base + like_bonus + quality
+    year_str = (movie.release_date or "")[:4]
+    year = int(year_str) if year_str.isdigit() else None
+    overview = movie.overview or ""
+    poster_path = movie.poster_path
+    poster_url = TMDB_IMG + poster_path if poster_path else None
+    tmdb_vote = movie.vote_average
+
+    # IMDb rating (and its quality bonus) is filled in later by fetch_imdb,
+    # only for recs that get a chance to reach the page
+    score = float(tmdb_vote or 0.0) + like_bonus
 
     return Rec(
         tmdb_id=tmdb_id,
@@ -281,11 +490,127 @@ def build_rec(movie: dict, like_bonus: float = 0.0) -> Optional[Rec]:
         overview=overview,
         poster_url=poster_url,
         tmdb_vote=tmdb_vote,
-        imdb_rating=imdb_rating,
+        imdb_rating=None,
         score=score,
+        imdb_link=google_link(f"{title} imdb"),
+        watch_link=google_link(f"{title} watch on {watch_service}" if watch_service else f"{title} where to watch"),
     )
 
 
+def fetch_imdb(r: Rec) -> Rec:
+    """
+    Fill in the IMDb rating via OMDb and add the quality bonus when one is found.
+    """
+    ext = tmdb_movie_bundle(r.tmdb_id).get("external_ids") or {}
+    imdb_id = ext.get("imdb_id")
+    if imdb_id:
+        r.imdb_rating = safe_float(omdb_lookup(imdb_id).get("imdbRating"))
+    if r.imdb_rating is not None:
+        r.score += IMDB_QUALITY_BONUS
+    return r
+
+
+def stream_verified(pool: Executor, recs: List[Rec], imdb_min: float, n: int) -> Iterator[Rec]:
+    """
+    Yield recs best-first by final score as their IMDb ratings arrive, skipping
+    any rated below imdb_min, until n have been yielded.
+
+    recs must be ranked by score. A verified rec is held back until no pending
+    rec could overtake it with the quality bonus, so the order matches sorting
+    the fully verified list.
+    """
+    # Scores before fetch_imdb adds the bonus; results arrive in this order
+    base_scores = [r.score for r in recs]
+    results = pool.map(fetch_imdb, recs)
+    held: List[Tuple[float, int, Rec]] = []
+    try:
+        kept = 0
+        for i, r in enumerate(results):
+            if r.imdb_rating is None or r.imdb_rating >= imdb_min:
+                heapq.heappush(held, (-r.score, i, r))
+            # Best score any still-pending rec could reach
+            ceiling = base_scores[i + 1] + IMDB_QUALITY_BONUS if i + 1 < len(recs) else float("-inf")
+            while held and -held[0][0] >= ceiling:
+                yield heapq.heappop(held)[2]
+                kept += 1
+                if kept == n:
+                    return
+    finally:
+        # Cancels lookups that haven't started once we have enough
+        results.close()
+
+
+def _optional_column(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+@dataclass
+class RecTable:
+    """
+    Struct-of-arrays view of a set of recs. Deduping, the TMDB-vote prefilter
+    and ranking only touch the numeric columns (ids, scores, TMDB votes); the
+    Rec rows ride along for rendering. IMDb ratings are filled in later, per
+    rec, by fetch_imdb.
+    """
+    ids: np.ndarray  # int64
+    scores: np.ndarray  # float32
+    tmdb_votes: np.ndarray  # float64, NaN when missing
+    rows: List[Rec]
+
+    @classmethod
+    def from_recs(cls, recs: List[Rec]) -> "RecTable":
+        """
+        Build a table keeping only the highest-scoring rec per tmdb_id.
+        """
+        ids = np.fromiter((r.tmdb_id for r in recs), dtype=np.int64, count=len(recs))
+        scores = np.fromiter((r.score for r in recs), dtype=np.float32, count=len(recs))
+
+        # Group by id with the best score first; the first row of each group wins
+        order = np.lexsort((-scores, ids))
+        _, first = np.unique(ids[order], return_index=True)
+        keep = np.sort(order[first])
+
+        rows = [recs[i] for i in keep]
+        return cls(
+            ids=ids[keep],
+            scores=scores[keep],
+            tmdb_votes=_optional_column(r.tmdb_vote for r in rows),
+            rows=rows,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def take(self, idx: np.ndarray) -> "RecTable":
+        return RecTable(
+            ids=self.ids[idx],
+            scores=self.scores[idx],
+            tmdb_votes=self.tmdb_votes[idx],
+            rows=[self.rows[i] for i in idx],
+        )
+
+    def where(self, mask: np.ndarray) -> "RecTable":
+        return self.take(np.flatnonzero(mask))
+
+    def top(self, n: int) -> "RecTable":
+        """
+        Highest-scoring n rows, best first, in the same order as a stable sort.
+        Selects in O(N) and only sorts the winners.
+        """
+        scores = self.scores
+        n = min(max(n, 0), len(self))
+        if 0 < n < len(self):
+            # argpartition picks arbitrarily among ties at the cutoff, so take
+            # everything above the nth score and then the earliest rows tied with it
+            cutoff = -np.partition(-scores, n - 1)[n - 1]
+            above = np.flatnonzero(scores > cutoff)
+            tied = np.flatnonzero(scores == cutoff)[: n - len(above)]
+            idx = np.sort(np.concatenate([above, tied]))
+        else:
+            idx = np.arange(n)
+        return self.take(idx[np.argsort(-scores[idx], kind="stable")])
+
+
 # ----------------------------
 # App
 # ----------------------------
@@ -299,13 +624,20 @@ st.caption("Choose services + genre + scores, add a few movies you like, and get
 # Session state setup
 if "like_titles" not in st.session_state:
     st.session_state.like_titles = []
+if "like_titles_sel" not in st.session_state:
+    st.session_state.like_titles_sel = list(st.session_state.like_titles)
 if "selected_services" not in st.session_state:
     st.session_state.selected_services = {"Netflix", "Prime Video"}
 
 
-with st.sidebar:
+@st.fragment
+def render_filters() -> None:
+    """
+    Sidebar filters. Runs as a fragment so tweaking a filter only reruns the
+    sidebar; values are read back from session state by render_recs.
+    """
     st.header("Filters")
-    region = st.selectbox("Region", REGIONS, index=0)
+    st.selectbox("Region", REGIONS, index=0, key="region")
 
     # Services as pills
     st.session_state.selected_services = service_pills(
@@ -313,121 +645,160 @@ with st.sidebar:
         st.session_state.selected_services,
     )
 
-    genre = st.selectbox("Genre", options=["(Any)"] + list(GENRES.keys()), index=0)
-    genre_id = None if genre == "(Any)" else GENRES[genre]
+    st.selectbox("Genre", options=["(Any)"] + list(GENRES.keys()), index=0, key="genre")
 
     st.subheader("Score sliders")
-    imdb_min = st.slider("IMDb minimum", 0.0, 10.0, 6.5, 0.1)
+    st.slider("IMDb minimum", 0.0, 10.0, 6.5, 0.1, key="imdb_min")
 
     # UI-only by default (until you add a data source)
-    rt_min = st.slider("Rotten Tomatoes minimum (optional)", 0, 100, 60, 1)
-    lb_min = st.slider("Letterboxd minimum (optional)", 0.0, 5.0, 3.5, 0.1)
+    st.slider("Rotten Tomatoes minimum (optional)", 0, 100, 60, 1, key="rt_min")
+    st.slider("Letterboxd minimum (optional)", 0.0, 5.0, 3.5, 0.1, key="lb_min")
 
     st.divider()
-    n_results = st.slider("How many recommendations?", 5, 30, 12, 1)
+    st.slider("How many recommendations?", 5, 30, 12, 1, key="n_results")
 
-# Like movies tag UI
-st.subheader("Movies you like (tags)")
-cA, cB = st.columns([3, 1])
-with cA:
-    new_like = st.text_input("Add a movie", placeholder="e.g., Heat", label_visibility="collapsed")
-with cB:
-    if st.button("Add", type="secondary"):
-        t = (new_like or "").strip()
-        if t and t not in st.session_state.like_titles:
-            st.session_state.like_titles.append(t)
-            st.rerun()
 
-render_like_chips(st.session_state.like_titles)
+def render_rec(r: Rec) -> None:
+    cols = st.columns([1, 3, 2])
 
-st.divider()
+    with cols[0]:
+        if r.poster_url:
+            st.image(r.poster_url)
+        else:
+            st.write("🖼️ No poster")
+
+    with cols[1]:
+        title_line = f"**{r.title}**" + (f" ({r.year})" if r.year else "")
+        st.markdown(title_line)
+        if r.overview:
+            st.caption(r.overview[:220] + ("…" if len(r.overview) > 220 else ""))
+
+        tmdb_txt = f"TMDB: {r.tmdb_vote:.1f}/10" if r.tmdb_vote is not None else "TMDB: n/a"
+        imdb_txt = f"IMDb: {r.imdb_rating:.1f}/10" if r.imdb_rating is not None else "IMDb: n/a"
+        st.write(f"{tmdb_txt} • {imdb_txt}")
 
-go = st.button("Recommend 🍿", type="primary")
+    with cols[2]:
+        st.markdown("**Links**")
+        st.link_button("IMDb (Google)", r.imdb_link)
+        st.link_button("Where to watch (Google)", r.watch_link)
 
 
-if go:
+@st.fragment
+def render_recs() -> None:
+    """
+    Recommend button + results. Runs as a fragment so a click only reruns
+    this section, not the whole page.
+    """
+    go = st.button("Recommend 🍿", type="primary")
+    if not go:
+        st.info("Pick your services + genre, add a couple movies you like, then hit **Recommend 🍿**.")
+        return
+
+    region = st.session_state.region
+    genre = st.session_state.genre
+    genre_id = None if genre == "(Any)" else GENRES[genre]
+    imdb_min = st.session_state.imdb_min
+    n_results = st.session_state.n_results
     selected_services = st.session_state.selected_services
     selected_provider_ids = {PROVIDER_NAME_TO_ID[s] for s in selected_services}
 
-    rec_pool: Dict[int, Rec] = {}
-
-    with st.spinner("Building recommendations..."):
-        # 1) Personalized from likes
-        liked_tmdb_ids: List[int] = []
-        for t in st.session_state.like_titles:
-            hit = tmdb_search_movie(t)
-            if hit:
-                liked_tmdb_ids.append(hit["id"])
-
-        for mid in liked_tmdb_ids:
-            for m in tmdb_recommendations(mid, pages=2):
-                r = build_rec(m, like_bonus=1.25)
-                if not r:
-                    continue
-                if r.tmdb_id not in rec_pool or r.score > rec_pool[r.tmdb_id].score:
-                    rec_pool[r.tmdb_id] = r
-
-        # 2) Broad discover (fills gaps)
-        for m in tmdb_discover_movies(region=region, genre_id=genre_id, provider_ids=list(selected_provider_ids), pages=3):
-            r = build_rec(m, like_bonus=0.0)
-            if not r:
-                continue
-            if r.tmdb_id not in rec_pool or r.score > rec_pool[r.tmdb_id].score:
-                rec_pool[r.tmdb_id] = r
-
-        # 3) Filter
-        filtered: List[Rec] = []
-        for r in rec_pool.values():
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        with st.spinner("Building recommendations..."):
+            candidates: List[Tuple[Movie, float]] = []
+
+            # Discover doesn't depend on the likes, so its pages run alongside them
+            params = discover_params(region, genre_id, sorted(selected_provider_ids))
+            discover_futures = [pool.submit(tmdb_discover_page, params, p) for p in range(1, DISCOVER_PAGES + 1)]
+
+            # 1) Personalized from likes
+            # Same title typed twice, or two titles resolving to one movie, only
+            # cost one search / one recommendations fanout
+            titles = [t for t in dict.fromkeys(map(normalize_title, st.session_state.like_titles)) if t]
+            hits = pool.map(tmdb_search_movie, titles)
+            liked_tmdb_ids: List[int] = list(dict.fromkeys(hit["id"] for hit in hits if hit))
+
+            for movies in pool.map(lambda mid: tmdb_recommendations(mid, pages=2), liked_tmdb_ids):
+                candidates.extend((m, 1.25) for m in movies)
+
+            # 2) Broad discover (fills gaps)
+            for f in discover_futures:
+                candidates.extend((m, 0.0) for m in f.result())
+
+            # Warm the per-movie bundle once per unique id so the filter only
+            # hits the cache
+            if selected_provider_ids:
+                candidate_ids = list(dict.fromkeys(m.id for m, _ in candidates if m.id))
+                list(pool.map(tmdb_movie_bundle, candidate_ids))
+
+            # pick one (first) service for the watch link to keep it simple
+            watch_service = sorted(selected_services)[0] if selected_services else None
+            # build_rec does no I/O, so it runs inline rather than through the pool
+            recs = [r for r in (build_rec(m, like_bonus=b, watch_service=watch_service) for m, b in candidates) if r]
+            table = RecTable.from_recs(recs)
+
+            # 3) Filter
             # Best-effort: enforce service availability using TMDB providers
-            if not movie_available_on_selected_services(r.tmdb_id, region, selected_provider_ids):
-                continue
-
-            # IMDb min: enforce only if we have an IMDb rating
-            if OMDB_API_KEY and r.imdb_rating is not None and r.imdb_rating < imdb_min:
-                continue
+            if selected_provider_ids:
+                ids = table.ids.tolist()
+                avail = {
+                    mid: extract_provider_ids_for_region(tmdb_movie_bundle(mid).get("watch/providers") or {}, region)
+                    for mid in ids
+                }
+                table = table.where(
+                    np.fromiter((bool(avail[mid] & selected_provider_ids) for mid in ids), dtype=bool, count=len(ids))
+                )
+
+            # IMDb min: TMDB vote is a cheap prefilter; OMDb is asked lazily in
+            # rank order, and the minimum is enforced only if we get an IMDb
+            # rating back
+            if OMDB_API_KEY:
+                votes = table.tmdb_votes
+                table = table.where(np.isnan(votes) | (votes >= imdb_min - IMDB_PREFILTER_MARGIN))
+                # Lookups run in rank order and stop once n_results pass, so
+                # only about MAX_WORKERS run past the cutoff
+                ranked = table.top(len(table)).rows
+                results = stream_verified(pool, ranked, imdb_min, n_results)
+            else:
+                results = iter(table.top(n_results).rows)
+
+        # Each card renders as soon as its rec is ready rather than after the
+        # whole batch; the summary above them is filled in once all are out
+        summary = st.empty()
+        if OMDB_API_KEY:
+            summary.info("Checking IMDb ratings…")
+        shown = 0
+        for r in results:
+            render_rec(r)
+            shown += 1
+
+    if not shown:
+        summary.warning("No matches found. Try selecting fewer services or lowering the IMDb minimum.")
+    else:
+        summary.success(f"Top {shown} picks based on your filters.")
+        st.caption(
+            "RT/Letterboxd sliders are UI placeholders until you connect a data source for those scores. "
+            "IMDb filtering is applied when OMDb is configured."
+        )
 
-            filtered.append(r)
 
-        filtered.sort(key=lambda x: x.score, reverse=True)
-        top = filtered[:n_results]
+with st.sidebar:
+    render_filters()
 
-    if not top:
-        st.warning("No matches found. Try selecting fewer services or lowering the IMDb minimum.")
-    else:
-        st.success(f"Top {len(top)} picks based on your filters.")
+# Like movies tag UI
+st.subheader("Movies you like (tags)")
+cA, cB = st.columns([3, 1])
+with cA:
+    new_like = st.text_input("Add a movie", placeholder="e.g., Heat", label_visibility="collapsed")
+with cB:
+    if st.button("Add", type="secondary"):
+        t = (new_like or "").strip()
+        if t and normalize_title(t) not in {normalize_title(x) for x in st.session_state.like_titles}:
+            st.session_state.like_titles.append(t)
+            st.session_state.like_titles_sel = list(st.session_state.like_titles)
+            st.rerun()
 
-        for r in top:
-            cols = st.columns([1, 3, 2])
+like_tags(st.session_state.like_titles)
 
-            with cols[0]:
-                if r.poster_url:
-                    st.image(r.poster_url)
-                else:
-                    st.write("🖼️ No poster")
-
-            with cols[1]:
-                title_line = f"**{r.title}**" + (f" ({r.year})" if r.year else "")
-                st.markdown(title_line)
-                if r.overview:
-                    st.caption(r.overview[:220] + ("…" if len(r.overview) > 220 else ""))
-
-                tmdb_txt = f"TMDB: {r.tmdb_vote:.1f}/10" if r.tmdb_vote is not None else "TMDB: n/a"
-                imdb_txt = f"IMDb: {r.imdb_rating:.1f}/10" if r.imdb_rating is not None else "IMDb: n/a"
-                st.write(f"{tmdb_txt} • {imdb_txt}")
-
-            with cols[2]:
-                st.markdown("**Links**")
-                st.link_button("IMDb (Google)", google_link(f"{r.title} imdb"))
-                if selected_services:
-                    # pick one (first) to keep it simple
-                    svc = sorted(list(selected_services))[0]
-                    st.link_button("Where to watch (Google)", google_link(f"{r.title} watch on {svc}"))
-                else:
-                    st.link_button("Where to watch (Google)", google_link(f"{r.title} where to watch"))
+st.divider()
 
-        st.caption(
-            "RT/Letterboxd sliders are UI placeholders until you connect a data source for those scores. "
-            "IMDb filtering is applied when OMDb is configured."
-        )
-else:
-    st.info("Pick your services + genre, add a couple movies you like, then hit **Recommend 🍿**.")
+render_recs()